@@ -1,24 +1,26 @@
-"""Elixir
+"""Command line interface for Elixir.
 
-Usage:
-  elixir <source> <dest> [options]
-  elixir -h | --help
-
-Options:
-    -h, --help              Show this screen.
-    -m, --model-name <name> The name of the top-level container folder (default:
-                            folder name of the `source` argument.)
-    -p, --processor <name>  Use an engine when compiling.
+Run `elixir -h` to see all of the arguments and options.
 """
 
-import os
+import argparse
 import os.path
 
-from docopt import docopt
-
 from elixir.compilers import ModelCompiler
 import elixir.processors
 
+# Built once when the module is imported, rather than every time `main()` runs.
+parser = argparse.ArgumentParser(prog="elixir",
+    description="Compiles Lua source code into a ROBLOX-compatible XML file.")
+
+parser.add_argument("source",
+    help="The directory containing Lua code and ROBLOX Models to compile.")
+parser.add_argument("dest",
+    help="The name of the file to create (eg. model.rbxmx).")
+parser.add_argument("-p", "--processor", metavar="<name>",
+    default="BaseProcessor",
+    help="Use a processor when compiling (default: BaseProcessor).")
+
 def get_processor(processor_name):
     """Gets a processor by its name.
 
@@ -33,16 +35,14 @@ def get_processor(processor_name):
     if processor_name in dir(elixir.processors):
         return getattr(elixir.processors, processor_name)
 
-def main():
-    args = docopt(__doc__)
+def main(argv=None):
+    args = parser.parse_args(argv)
 
-    source = os.path.abspath(args["<source>"])
-    dest = os.path.abspath(args["<dest>"])
-    model_name = args["--model-name"]
-    processor = args["--processor"] or "BaseProcessor"
+    source = os.path.abspath(args.source)
+    dest = os.path.abspath(args.dest)
 
-    compiler = ModelCompiler(source, dest, model_name=model_name,
-        processor=get_processor(processor))
+    compiler = ModelCompiler(source, dest,
+        processor=get_processor(args.processor))
     compiler.compile()
 
 if __name__ == '__main__':
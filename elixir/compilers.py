@@ -1,14 +1,44 @@
+import io
+import itertools
 import os
 import os.path
-from xml.etree import ElementTree
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from elixir import rbxmx
-from elixir.processors import BaseProcessor
+from elixir.processors import BaseProcessor, split_extension
+
+# The model is written out a piece at a time as the source is walked. Buffering
+# those pieces keeps us from making a write() call for every single element.
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Reading files is mostly spent waiting on the disk, so we can have a lot more
+# threads going than there are CPUs.
+READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# How many entries in a directory can be submitted ahead of the one being
+# written. Finished scripts hold their whole source until they're written, so
+# this keeps a large flat directory from being read into memory all at once.
+READ_AHEAD = READ_WORKERS * 2
+
+def _write_contents(compiler, path):
+    """Writes the contents of a directory to a string of bytes.
+
+    This is what each worker process runs when compiling with `processes`. It
+    has to live at the top-level of the module so that it can be pickled.
+    """
+
+    with io.BytesIO() as f:
+        compiler._write_hierarchy(f, path)
+        return f.getvalue()
 
 def create_path(path):
     parent_folders = os.path.dirname(path)
-    if parent_folders and not os.path.exists(parent_folders):
-        os.makedirs(parent_folders)
+
+    # Letting `makedirs` handle folders that already exist saves checking for
+    # them first.
+    if parent_folders:
+        os.makedirs(parent_folders, exist_ok=True)
 
 class BaseCompiler:
     def __init__(self, source, dest):
@@ -57,53 +87,207 @@ class ModelCompiler(BaseCompiler):
 
         For example, when BaseProcessor comes across a Lua file, it will return
         a new `elixir.rbx.Script` instance.
+    processes=None : int
+        The number of processes to compile with.
+
+        When set, each folder at the top of `source` is compiled in its own
+        process, which helps on large projects with lots of CPUs to spare. By
+        default everything is compiled in the current process.
+
+        The processor needs to be picklable for this to work. Like any use of
+        multiprocessing, your build script should only compile from under an
+        `if __name__ == "__main__":` block.
     """
 
-    def __init__(self, source, dest, processor=BaseProcessor):
+    def __init__(self, source, dest, processor=BaseProcessor, processes=None):
         super().__init__(source, dest)
 
         self.processor = processor()
+        self.processes = processes
+
+    def _scan_directory(self, path):
+        """Yields the entries in a directory that get compiled.
+
+        Each entry comes with whether it's a directory. Files the processor
+        doesn't know how to handle (eg. `.DS_Store`) are left out, without ever
+        being read.
+
+        `scandir` gives us each entry's type along with its name, so we don't
+        need to stat every file to find out if it's a directory. Symlinks are
+        followed (like `os.path.isdir`), so a linked folder is compiled along
+        with its contents.
+
+        Both ways of walking the source go through this, so they always agree
+        on what gets compiled.
+
+        path : str
+            The path to the directory to scan.
+        """
+
+        file_extensions = self.processor.file_extensions
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    yield entry, True
+                elif split_extension(entry.name)[1] in file_extensions:
+                    yield entry, False
+
+    def _list_directory(self, executor, path):
+        """Lists a directory, handing its files off to be processed.
+
+        This yields `(entry, future)` pairs in the order the directory lists
+        them. Directories don't get a future, they're processed once the
+        compiler steps into them.
+
+        Only `READ_AHEAD` entries are submitted ahead of the one that was last
+        yielded. The next file is submitted each time an entry is taken, so
+        there's always work queued up without the whole directory being read
+        in at once.
 
-    def _create_hierarchy(self, path):
-        """Turns a directory structure into ROBLOX-compatible XML.
+        executor : Executor
+            Where files are submitted for processing.
+        path : str
+            The path to the directory to list.
+        """
+
+        get_element = self.processor.get_element
+        pending = deque()
+
+        # The scan is read in up front, so that the directory isn't held open
+        # while we're off writing its contents.
+        for entry, is_dir in list(self._scan_directory(path)):
+            if is_dir:
+                pending.append((entry, None))
+            else:
+                pending.append((entry, executor.submit(get_element, entry)))
+
+            if len(pending) >= READ_AHEAD:
+                yield pending.popleft()
+
+        yield from pending
 
+    def _write_hierarchy(self, f, path):
+        """Writes a directory structure to `f` as ROBLOX-compatible XML.
+
+        Elements are written out as soon as they're processed, rather than
+        building up the whole model in memory first. Folders are written in two
+        halves: the start is written when we enter the directory, and the end
+        tag once we've written everything inside of it.
+
+        Files are read and processed on a pool of threads, since most of that
+        time is spent waiting on the disk. Their XML is still written in the
+        order the directory lists them, and only a few files past the one
+        being written are read ahead of time.
+
+        f : file
+            A file opened for writing in binary mode.
         path : str
-            The path to a directory to recurse through.
+            The path to a directory to walk through.
         """
 
-        root_xml = rbxmx.get_base_tag()
+        # Bound once up here, rather than being looked up again on every pass
+        # through the loop below.
+        tostring = rbxmx.tostring
+        tostring_start = rbxmx.tostring_start
+        tostring_end = rbxmx.tostring_end
+        get_element = self.processor.get_element
+
+        def write(xml):
+            f.write(xml.encode("utf-8"))
+
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            # Rather than recursing into each directory, we keep a stack of the
+            # directories we're in the middle of, along with the end tag to
+            # close them with. This keeps deeply nested projects from hitting
+            # Python's recursion limit.
+            stack = [(self._list_directory(executor, path), None)]
 
-        def recurse(path, hierarchy):
-            for item in os.listdir(path):
-                item_path = os.path.join(path, item)
+            while stack:
+                listing, end_tag = stack[-1]
+                entry, future = next(listing, (None, None))
 
-                element = self.processor.get_element(item_path)
-                xml = element.get_xml()
-                element.append_to(hierarchy)
+                # The directory has been exhausted, so we can close it off and
+                # move back up to its parent.
+                if entry is None:
+                    stack.pop()
 
-                if os.path.isdir(item_path):
-                    recurse(item_path, xml)
+                    if end_tag:
+                        write(end_tag)
 
-        recurse(path, root_xml)
+                    continue
 
-        return root_xml
+                if future is None:
+                    xml = get_element(entry).get_xml()
+                    children = self._list_directory(executor, entry.path)
+                    first = next(children, None)
 
-    def _create_model(self):
-        return self._create_hierarchy(self.source)
+                    # Empty folders can be written in one go, there's no need
+                    # to step into them.
+                    if first is None:
+                        write(tostring(xml))
+                    else:
+                        write(tostring_start(xml))
+                        children = itertools.chain((first,), children)
+                        stack.append((children, tostring_end(xml)))
+                else:
+                    for xml in future.result().get_importable_xml():
+                        write(tostring(xml))
+
+    def _write_hierarchy_in_processes(self, f):
+        """Writes the source directory to `f`, using a pool of processes.
+
+        The folders at the top of the source directory are each compiled in a
+        worker process, and the XML they send back is written between the
+        folder's start and end tags. Files at the top are compiled here, in
+        between waiting on the folders.
+
+        f : file
+            A file opened for writing in binary mode.
+        """
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            listing = []
+
+            for entry, is_dir in self._scan_directory(self.source):
+                if is_dir:
+                    future = executor.submit(_write_contents, self, entry.path)
+                    listing.append((entry, future))
+                else:
+                    listing.append((entry, None))
+
+            for entry, future in listing:
+                element = self.processor.get_element(entry)
+
+                if future is None:
+                    for xml in element.get_importable_xml():
+                        f.write(rbxmx.tostring(xml).encode("utf-8"))
+                else:
+                    xml = element.get_xml()
+                    f.write(rbxmx.tostring_start(xml).encode("utf-8"))
+                    f.write(future.result())
+                    f.write(rbxmx.tostring_end(xml).encode("utf-8"))
 
     def _write_model(self):
         """Compiles the model and writes it to the output file."""
 
+        root = rbxmx.get_base_tag()
+
         # Writing as binary so that we can use UTF-8 encoding.
-        with open(self.dest, "wb+") as f:
-            model = self._create_model()
-            tree = ElementTree.ElementTree(model)
-
-            # ROBLOX does not support self-closing tags. In the event that an
-            # element is blank (eg. a script doesn't have any contents) you
-            # won't be able to import the model. We need to ensure all elements
-            # have an ending tag by setting `short_empty_elements=False`.
-            tree.write(f, encoding="utf-8", short_empty_elements=False)
+        #
+        # ROBLOX does not support self-closing tags. In the event that an
+        # element is blank (eg. a script doesn't have any contents) you won't
+        # be able to import the model. `rbxmx.tostring` makes sure all elements
+        # have an ending tag.
+        with open(self.dest, "wb+", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(rbxmx.tostring_start(root).encode("utf-8"))
+
+            if self.processes:
+                self._write_hierarchy_in_processes(f)
+            else:
+                self._write_hierarchy(f, self.source)
+
+            f.write(rbxmx.tostring_end(root).encode("utf-8"))
 
     def compile(self):
         """Compiles source code into a ROBLOX Model file."""
@@ -1,11 +1,60 @@
-import os.path
-
 from elixir import rbxmx
 
-def _get_file_contents(path):
-    if os.path.isfile(path):
-        with open(path) as f:
-            return f.read()
+def split_extension(name):
+    """Splits a file name into its name and extension.
+
+    This works the same as `os.path.splitext`, but only for file names, not
+    full paths. Since it doesn't need to look for path separators it's a good
+    deal faster, and it's used on every file we come across.
+
+    Leading dots don't count as an extension, so `.lua` is a file without one
+    (just like with `splitext`).
+
+    name : str
+        The name of a file, such as `DirEntry.name`.
+    """
+
+    base, dot, ext = name.rpartition(".")
+
+    # There has to be something other than dots in front of the extension.
+    if base.strip("."):
+        return base, dot + ext
+    else:
+        return name, ""
+
+def _decode_source(content):
+    """Decodes the raw bytes of a Lua file.
+
+    This is what opening the file in text mode would give us, but decoding the
+    whole file at once is faster than going through a TextIOWrapper. It also
+    means we always use UTF-8 (which is what ROBLOX expects) rather than
+    whatever the locale's preferred encoding happens to be.
+
+    content : bytes
+        The contents of the file.
+    """
+
+    content = content.decode("utf-8")
+
+    # Text mode translates all line endings to "\n", so we have to as well.
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+
+    return content
+
+def _get_file_contents(path, mode="r"):
+    # Opening the file and handling the error is cheaper than checking that it
+    # exists first, since that would be an extra stat() for every file.
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+
+    if "b" in mode:
+        return content
+    else:
+        return _decode_source(content)
 
 def _get_script_class(content):
     """Checks a file's content to determine the type of Lua Script it is."""
@@ -26,6 +75,11 @@ class BaseProcessor:
     these instances is then appended into the hierarchy when compiling.
     """
 
+    # The types of files that `get_element()` knows how to process. Compilers
+    # skip over any other files without reading them, so be sure to add to this
+    # if you handle more file types in a subclass.
+    file_extensions = frozenset({ ".lua", ".rbxmx" })
+
     def process_folder(self, name):
         """Processing for folders.
 
@@ -38,8 +92,8 @@ class BaseProcessor:
     def process_model(self, content):
         """Processing for ROBLOX Model files (.rbxmx).
 
-        content : str
-            The contents of the Model file.
+        content : bytes|str
+            The contents of the Model file. Compilers pass this in as bytes.
         """
 
         return rbxmx.ModelElement(content)
@@ -60,27 +114,31 @@ class BaseProcessor:
 
         return script
 
-    def get_element(self, path):
+    def get_element(self, entry):
         """Returns a Python instance representing a ROBLOX instance.
 
-        This routes `path` to the most appropriate `process` method and returns
+        This routes `entry` to the most appropriate `process` method and returns
         one of the classes from `rbxmx`.
 
-        path : str
-            The path to a folder or file to be processed.
+        entry : os.DirEntry
+            The folder or file to be processed, as yielded by `os.scandir`.
         """
 
-        name = os.path.basename(path)
+        name = entry.name
 
-        if os.path.isdir(path):
+        if entry.is_dir():
             return self.process_folder(name)
         else:
-            name, ext = os.path.splitext(name)
-            content = _get_file_contents(path)
+            name, ext = split_extension(name)
 
             if ext == ".lua":
+                content = _get_file_contents(entry.path)
                 return self.process_script(name, content)
             elif ext == ".rbxmx":
+                # Models are left as bytes. The XML parser works with bytes
+                # natively, where it would otherwise have to encode a string
+                # back to UTF-8 before parsing it.
+                content = _get_file_contents(entry.path, "rb")
                 return self.process_model(content)
 
 class NevermoreProcessor(BaseProcessor):
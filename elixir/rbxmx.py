@@ -7,15 +7,37 @@ This module is for constructing ROBLOX Models from a folder structure and Lua
 files, as well as importing existing Models when compiling.
 """
 
-def _is_lua_comment(line):
-    """Checks if a line of text is a Lua comment.
-
-    line : str
-        A line from some Lua source code.
-    """
-
-    # Matching spaces so that we don't pick up block comments (--[[ ]])
-    return re.match(r"^--\s+", line)
+# These patterns are used on every Lua file that gets compiled, so they're only
+# compiled once, up here.
+
+# Everything `str.splitlines()` breaks lines on, other than "\r\n" (which is
+# just "\r" followed by "\n"). Lines are split the same way when looking for
+# the first comment, so form feeds and Unicode separators end a line too.
+_LINE_BREAKS = r"\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+# The first run of inline comments in the source. Each line needs to start with
+# two dashes and a space, so that we don't pick up block comments (--[[ ]]).
+#
+# The whitespace after the dashes has to stay on the same line, otherwise a
+# line with just `--` would run into the line after it.
+_FIRST_COMMENT_PATTERN = re.compile(r"""
+    (?:\A|(?<=[{0}]))          # The start of a line
+    --[^\S{0}]+[^{0}]*         # The first comment
+    (?:(?:\r\n|[{0}])          # Followed by any comments on the next lines
+        --[^\S{0}]+[^{0}]*)*
+    """.format(_LINE_BREAKS), re.VERBOSE)
+
+# Used by `is_module()` for checking the end of the source.
+_RETURN_PATTERN = re.compile(r"return\s")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# For `name` we only need to match whole words, as ROBLOX's properties don't
+# have any special characters. `value` on the other hand can use any character.
+_PROPERTY_PATTERN = re.compile(r"(?P<name>\w+):\s+(?P<value>.+)")
+
+# Lua's spelling of each bool value. Looking these up saves creating a new
+# string and lowercasing it for every bool property.
+_LUA_BOOLS = { True: "true", False: "false" }
 
 def _convert_bool(b):
     """Converts Python bool values to Lua's.
@@ -25,7 +47,41 @@ def _convert_bool(b):
     and it must also be lowercased to match Lua's bool values, otherwise ROBLOX
     won't recognize them.
     """
-    return str(b).lower()
+    return _LUA_BOOLS[b]
+
+def _escape_text(text):
+    """Escapes text content for the XML (&, < and >).
+
+    Most text doesn't need escaping at all, so we check for each character
+    before doing a replacement. This is the same approach ElementTree takes.
+    """
+
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+def _escape_attrib(value):
+    """Escapes an attribute value for the XML.
+
+    On top of what `_escape_text()` handles, quotes and whitespace characters
+    need to be escaped so they survive being read back in.
+    """
+
+    value = _escape_text(value)
+
+    if "\"" in value:
+        value = value.replace("\"", "&quot;")
+    if "\r" in value:
+        value = value.replace("\r", "&#13;")
+    if "\n" in value:
+        value = value.replace("\n", "&#10;")
+    if "\t" in value:
+        value = value.replace("\t", "&#09;")
+    return value
 
 def _sanitize(content):
     """Makes sure `content` is safe to go in the XML.
@@ -33,11 +89,20 @@ def _sanitize(content):
     This is mostly for converting Python types into something XML compatible.
     """
 
-    if type(content) == bool:
+    if isinstance(content, bool):
         return _convert_bool(content)
     else:
         return content
 
+# `version` is currently the only attribute that's required for ROBLOX to
+# recognize the file as a Model. All of the others are included to match what
+# ROBLOX outputs when  exporting a model to your computer.
+_BASE_TAG_ATTRIB = {
+    "xmlns:xmine": "http://www.w3.org/2005/05/xmlmime",
+    "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
+    "xsi:noNamespaceSchemaLocation": "http://www.roblox.com/roblox.xsd",
+    "version": "4" }
+
 def get_base_tag():
     """Gets the root <roblox> tag.
 
@@ -46,14 +111,8 @@ def get_base_tag():
     to this tag.
     """
 
-    # `version` is currently the only attribute that's required for ROBLOX to
-    # recognize the file as a Model. All of the others are included to match
-    # what ROBLOX outputs when  exporting a model to your computer.
-    return ElementTree.Element("roblox", attrib={
-        "xmlns:xmine": "http://www.w3.org/2005/05/xmlmime",
-        "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
-        "xsi:noNamespaceSchemaLocation": "http://www.roblox.com/roblox.xsd",
-        "version": "4" })
+    # Element copies `attrib`, so the shared dict is never modified.
+    return ElementTree.Element("roblox", attrib=_BASE_TAG_ATTRIB)
 
 def is_module(content):
     """Checks if the contents are from a Lua module.
@@ -65,33 +124,139 @@ def is_module(content):
         The Lua source code to check.
     """
 
-    # We match any number of whitespace after the `return` in case of accidental
-    # spacing on the user's part.
-    #
-    # Then we match any characters to catch variables (`return module`) and
-    # functions (`return setmetatable(t1, t2)`)
-    #
-    # We're optionally matching any number of spaces at the end of the file
-    # incase of a final newline, or accidentally added spaces after the value.
-    return re.search(r"return\s+.*(\s+)?$", content)
+    # Only the end of the file matters, so rather than running a pattern over
+    # the whole source we find the last line and work back from there. Any
+    # whitespace at the end of the file is ignored, in case of a final newline
+    # or accidentally added spaces after the value.
+    end = len(content.rstrip())
+    last_line_start = content.rfind("\n", 0, end) + 1
+
+    # A `return` on the last line, followed by the returned value. This catches
+    # variables (`return module`) and functions (`return setmetatable(t1, t2)`)
+    if _RETURN_PATTERN.search(content, last_line_start, end + 1):
+        return True
+
+    # The value can also be on its own line after the `return`, since we allow
+    # for any amount of whitespace after it.
+    index = content.rfind("return", 0, last_line_start)
+
+    if index == -1:
+        return False
+
+    return bool(_WHITESPACE_PATTERN.fullmatch(content, index + len("return"),
+        last_line_start))
+
+class _UnsupportedElement(Exception):
+    """Raised when an Element needs ElementTree's own serializer.
+
+    See `_serialize()` for what falls into this.
+    """
+
+def _serialize(element, parts, start_only=False):
+    """Converts an Element to XML, appending the pieces to `parts`.
+
+    Everything we generate, and everything in a typical ROBLOX Model, is made
+    up of plain tags with string attributes. Handling just that saves all of
+    the namespace bookkeeping that ElementTree does before it can write
+    anything.
+
+    Comments, processing instructions, namespaced names and non-string values
+    raise `_UnsupportedElement` so the caller can fall back on ElementTree.
+
+    With `start_only`, this stops after the Element's children, leaving off its
+    end tag and tail. The children are converted with `tostring()`, so they can
+    still fall back on ElementTree by themselves.
+    """
+
+    tag = element.tag
+
+    if type(tag) is not str or tag.startswith("{"):
+        raise _UnsupportedElement
+
+    parts.append("<" + tag)
+
+    for name, value in element.items():
+        if type(value) is not str or name.startswith("{"):
+            raise _UnsupportedElement
+
+        parts.append(" {}=\"{}\"".format(name, _escape_attrib(value)))
+
+    parts.append(">")
+
+    text = element.text
+    if text:
+        parts.append(_escape_text(text))
+
+    if start_only:
+        parts.extend(tostring(child) for child in element)
+        return
+
+    for child in element:
+        _serialize(child, parts)
+
+    parts.append("</" + tag + ">")
+
+    tail = element.tail
+    if tail:
+        parts.append(_escape_text(tail))
 
 def tostring(element):
     """A more specialized version of ElementTree's `tostring`.
 
-    We're using Unicode encoding so that this returns a string, instead of the
-    default bytestring.
+    This returns a string, instead of ElementTree's default bytestring.
+
+    All elements are output with their ending tags, as ROBLOX won't import the
+    file if there are any self-closing tags. This is what compilers use to
+    write out the model, so the string version of the XML is always consistent
+    with what gets written.
+    """
+
+    parts = []
+
+    try:
+        _serialize(element, parts)
+    except _UnsupportedElement:
+        return ElementTree.tostring(element, encoding="unicode",
+            short_empty_elements=False)
+
+    return "".join(parts)
+
+def tostring_start(element):
+    """Converts an Element to a string, leaving off its end tag.
+
+    This is used when writing a model incrementally. The contents of a folder
+    can be written out after its start, and then `tostring_end()` closes the
+    folder back up.
 
-    We're also setting `short_empty_elements` to `False` so that all elements
-    are output with their ending tags. This is only required when _writing_ the
-    XML, as ROBLOX won't import the file if there are any self-closing tags.
+    Any children the Element already has (like its Properties) are included.
+    The Element's tail is not, since it comes after the end tag.
 
-    This function isn't used for writing, so while ending tags aren't mandatory,
-    they're used here so the string version of the XML is consistent with what
-    gets written.
+    The start tag is written by hand, so the Element itself can't use the
+    things `tostring()` leaves to ElementTree (like namespaces). A ValueError
+    is raised if it does.
     """
 
-    return ElementTree.tostring(element, encoding="unicode",
-        short_empty_elements=False)
+    parts = []
+
+    try:
+        _serialize(element, parts, start_only=True)
+    except _UnsupportedElement:
+        raise ValueError("Can't write the start of {!r} on its own, only "
+            "plain tags with string attributes are supported".format(
+            element.tag)) from None
+
+    return "".join(parts)
+
+def tostring_end(element):
+    """Gets the end tag that closes off `tostring_start()`."""
+
+    tag = element.tag
+
+    if type(tag) is not str or tag.startswith("{"):
+        raise ValueError("Can't write the end of {!r} on its own, only plain "
+            "tags are supported".format(tag))
+
+    return "</{}>".format(tag)
 
 class PropertyElement:
     """Container for the properties of InstanceElement.
@@ -118,7 +283,9 @@ class PropertyElement:
             just get converted to Lua's bools.
         """
 
-        prop = ElementTree.SubElement(self.element, tag, name=name)
+        # The attributes are passed as a dict rather than keyword arguments,
+        # which saves ElementTree from having to merge them into one.
+        prop = ElementTree.SubElement(self.element, tag, { "name": name })
         prop.text = _sanitize(text)
 
         return prop
@@ -131,7 +298,11 @@ class PropertyElement:
             instance's name, "Source" for the Lua source code, etc.
         """
 
-        return self.element.find("*[@name='{}']".format(name))
+        # There are only ever a handful of properties, so checking each one is
+        # cheaper than building and parsing an XPath expression.
+        for prop in self.element:
+            if prop.get("name") == name:
+                return prop
 
     def set(self, name, new_value):
         """Changes the contents of a property to a new value."""
@@ -159,7 +330,7 @@ class InstanceElement:
 
         # `class` is a reserved keyword so we have to pass it in through
         # `attrib` rather than as a named parameter.
-        self.element = ElementTree.Element("Item", attrib={"class": class_name})
+        self.element = ElementTree.Element("Item", { "class": class_name })
 
         self.properties = PropertyElement(self.element)
         self.name = self.properties.add("string", "Name", name)
@@ -167,6 +338,18 @@ class InstanceElement:
     def get_xml(self):
         return self.element
 
+    def get_importable_xml(self):
+        """Gets the Elements that end up in the hierarchy.
+
+        For most instances this is just its own XML, but ModelElement overrides
+        this so that only the contents of the Model are imported.
+
+        This is what compilers use when they write out the Element, so
+        that InstanceElement's and ModelElement's are handled the same way.
+        """
+
+        return [self.get_xml()]
+
     def append_to(self, parent_element):
         """Appends the Element's XML to another Element.
 
@@ -177,8 +360,7 @@ class InstanceElement:
             The Element to append to.
         """
 
-        xml = self.get_xml()
-        parent_element.append(xml)
+        parent_element.extend(self.get_importable_xml())
 
 class ScriptElement(InstanceElement):
     def __init__(self, class_name="Script", name=None, source=None,
@@ -202,21 +384,12 @@ class ScriptElement(InstanceElement):
 
         if not source: return
 
-        found_first_comment = False
-        comment_lines = []
-
-        for line in source.splitlines():
-            is_comment = _is_lua_comment(line)
-            if is_comment:
-                found_first_comment = True
-                comment_lines.append(line)
-
-            # The first comment ended, time to break out
-            elif not is_comment and found_first_comment:
-                break
+        match = _FIRST_COMMENT_PATTERN.search(source)
 
-        if comment_lines:
-            return "\n".join(comment_lines)
+        if match:
+            # Splitting and joining the lines drops any carriage returns from
+            # Windows line endings.
+            return "\n".join(match.group().splitlines())
 
     def get_embedded_properties(self):
         """Gets properties that are embedded in the source.
@@ -245,17 +418,9 @@ class ScriptElement(InstanceElement):
         # need to continue from here.
         if not comment: return
 
-        # For `name` we only need to match whole words, as ROBLOX's
-        # properties don't have any special characters. `value` on the other
-        # hand can use any character.
-        property_pattern = re.compile(r"(?P<name>\w+):\s+(?P<value>.+)")
-
-        property_list = {}
-
-        for match in property_pattern.finditer(comment):
-            property_list[match.group("name")] = match.group("value")
-
-        return property_list
+        # Each match is a (name, value) pair, so they can go straight into a
+        # dict. Later lines win if a property is embedded more than once.
+        return dict(_PROPERTY_PATTERN.findall(comment))
 
     def use_embedded_properties(self):
         """Overrides the current properties with any embedded ones."""
@@ -275,19 +440,94 @@ class ContainerElement(InstanceElement):
         super().__init__(class_name, name)
 
 class ModelElement(InstanceElement):
-    def __init__(self, content):
-        self.element = ElementTree.XML(content)
+    """Imports the contents of an existing ROBLOX Model.
 
-    def append_to(self, parent_element):
-        """Imports the Model's contents into another Element.
+    The Model's XML isn't parsed until it's needed. When compiling, the
+    contents are parsed a piece at a time as they're written out, so a large
+    Model never has to be held in memory all at once.
 
-        parent_element : Element
-            The Element to append to.
+    content : bytes|str|Element
+        The contents of the Model file. If you've already parsed the Model you
+        can pass in its root Element instead, and it won't be parsed again.
+    """
+
+    # How much of the Model is fed to the parser at a time when streaming its
+    # contents.
+    chunk_size = 64 * 1024
+
+    def __init__(self, content):
+        if isinstance(content, ElementTree.Element):
+            self.content = None
+            self._element = content
+        else:
+            self.content = content
+            self._element = None
+
+    @property
+    def element(self):
+        if self._element is None:
+            self._element = ElementTree.XML(self.content)
+        return self._element
+
+    @element.setter
+    def element(self, element):
+        self._element = element
+
+    def _iter_contents(self):
+        """Parses the Model, yielding each Element inside its <roblox> tag.
+
+        Each Element is removed from the tree once it's been yielded, so only
+        one of them is kept around at a time.
         """
 
-        xml = self.get_xml()
+        parser = ElementTree.XMLPullParser(events=("start", "end"))
+        content = self.content
+
+        # Slicing a memoryview saves copying each chunk of the content.
+        if isinstance(content, bytes):
+            content = memoryview(content)
+
+        root = None
+        depth = 0
+        finished = None
+
+        def read_events():
+            nonlocal root, depth, finished
+
+            for event, element in parser.read_events():
+                # An Element's tail is only filled in once the parser moves on
+                # to the next tag, so we hold onto it until then.
+                if finished is not None:
+                    yield finished
+                    root.remove(finished)
+                    finished = None
+
+                if event == "start":
+                    if root is None:
+                        root = element
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 1:
+                        finished = element
+
+        for start in range(0, len(content), self.chunk_size):
+            parser.feed(content[start:start + self.chunk_size])
+            yield from read_events()
+
+        parser.close()
+        yield from read_events()
+
+    def get_importable_xml(self):
+        """Gets the contents of the Model to import into the hierarchy.
+
+        If the Model hasn't been parsed yet, this returns an iterator that
+        parses its contents as it goes.
+        """
 
         # Because Models have their own <roblox> tag, when importing we have to
         # skip over that and just use the inner Elements.
-        for element in list(xml):
-            parent_element.append(element)
+        if self._element is None:
+            return self._iter_contents()
+        else:
+            return list(self._element)
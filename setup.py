@@ -10,13 +10,10 @@ setup(
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
         "Natural Language :: English",
-        "Programming Language :: Python :: 3.4",
+        "Programming Language :: Python :: 3.6",
     ],
     keywords="lua roblox compiler",
     packages=["elixir"],
-    install_requires=[
-        "docopt"
-    ],
     entry_points={
         "console_scripts": [ "elixir=elixir.cli:main" ]
     }
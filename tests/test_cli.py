@@ -0,0 +1,17 @@
+from elixir import cli, processors
+
+class TestGettingProcessors:
+    def test_can_get_processor_by_name(self):
+        processor = cli.get_processor("NevermoreProcessor")
+
+        assert processor is processors.NevermoreProcessor
+
+class TestMain:
+    def test_compiles_source_to_dest(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.join("Script.lua").write("print(\"Hello, World!\")")
+        dest = tmpdir.join("model.rbxmx")
+
+        cli.main([ str(src), str(dest) ])
+
+        assert "Hello, World!" in dest.read()
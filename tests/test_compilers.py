@@ -0,0 +1,182 @@
+import os
+from xml.etree import ElementTree
+
+from elixir import compilers
+
+def _compile(source, dest, **kwargs):
+    compiler = compilers.ModelCompiler(str(source), str(dest), **kwargs)
+    compiler.compile()
+
+    return ElementTree.parse(str(dest)).getroot()
+
+class TestModelCompiler:
+    def test_folders_are_compiled_with_their_contents(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.mkdir("Modules").join("Hello.lua").write("return {}")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        folder = model.find("Item[@class='Folder']")
+        name = folder.find("Properties/string[@name='Name']")
+        module = folder.find("Item[@class='ModuleScript']")
+
+        assert name.text == "Modules"
+        assert module is not None
+
+    def test_empty_folders_are_compiled(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.mkdir("Empty")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        folder = model.find("Item[@class='Folder']")
+
+        assert folder.find("Properties/string[@name='Name']").text == "Empty"
+        assert folder.find("Item") is None
+        assert "<Properties>" in dest.read()
+
+    def test_lua_files_are_compiled_to_scripts(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.join("Script.lua").write("print(\"Hello, World!\")")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        script = model.find("Item[@class='Script']")
+        source = script.find("Properties/ProtectedString[@name='Source']")
+
+        assert source.text == "print(\"Hello, World!\")"
+
+    def test_scripts_are_written_in_directory_order(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        for i in range(50):
+            src.join("Script{}.lua".format(i)).write("")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        names = [ name.text for name in model.iterfind(
+            "Item/Properties/string[@name='Name']") ]
+        expected_names = [ os.path.splitext(item)[0]
+            for item in os.listdir(str(src)) ]
+
+        assert names == expected_names
+
+    def test_unknown_files_are_skipped(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.join(".DS_Store").write("")
+        src.join("README.md").write("# Hello, World!")
+        src.join("Script.lua").write("")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        assert len(model.findall("Item")) == 1
+
+    def test_models_are_unpacked_into_the_hierarchy(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.join("Model.rbxmx").write(
+            "<roblox version=\"4\"><Item class=\"Part\"></Item></roblox>")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        assert model.find("Item").get("class") == "Part"
+
+    def test_creates_directories_for_the_destination(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        dest = tmpdir.join("build", "model.rbxmx")
+
+        _compile(src, dest)
+
+        assert dest.check(file=True)
+
+    def test_can_compile_deeply_nested_folders(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        folder = src
+        for i in range(50):
+            folder = folder.mkdir("Folder")
+        folder.join("Script.lua").write("")
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        path = "/".join(["Item"] * 51)
+        script = model.find(path)
+
+        assert script.get("class") == "Script"
+
+    def test_symlinked_folders_are_compiled(self, tmpdir):
+        shared = tmpdir.mkdir("shared")
+        shared.join("Util.lua").write("return {}")
+        src = tmpdir.mkdir("src")
+        src.join("Shared").mksymlinkto(shared)
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        folder = model.find("Item[@class='Folder']")
+
+        assert folder.find("Properties/string[@name='Name']").text == "Shared"
+        assert folder.find("Item[@class='ModuleScript']") is not None
+
+    def test_symlinked_folders_with_extensions_are_still_folders(self, tmpdir):
+        shared = tmpdir.mkdir("shared")
+        src = tmpdir.mkdir("src")
+        src.join("Shared.lua").mksymlinkto(shared)
+        dest = tmpdir.join("model.rbxmx")
+
+        model = _compile(src, dest)
+
+        assert model.find("Item").get("class") == "Folder"
+
+    def test_compiling_in_processes_matches_compiling_in_one(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        src.join("Script.lua").write("print(\"Hello, World!\")")
+        for i in range(3):
+            folder = src.mkdir("Folder{}".format(i)).mkdir("Modules")
+            folder.join("Module.lua").write("return {}")
+        dest = tmpdir.join("model.rbxmx")
+        dest_in_processes = tmpdir.join("model-in-processes.rbxmx")
+
+        _compile(src, dest)
+        _compile(src, dest_in_processes, processes=2)
+
+        assert dest.read() == dest_in_processes.read()
+
+    def test_compiling_in_processes_includes_the_same_entries(self, tmpdir):
+        shared = tmpdir.mkdir("shared")
+        shared.join("Util.lua").write("return {}")
+        src = tmpdir.mkdir("src")
+        src.join(".DS_Store").write("")
+        src.join("Shared").mksymlinkto(shared)
+        dest = tmpdir.join("model.rbxmx")
+        dest_in_processes = tmpdir.join("model-in-processes.rbxmx")
+
+        _compile(src, dest)
+        _compile(src, dest_in_processes, processes=2)
+
+        assert dest.read() == dest_in_processes.read()
+
+    def test_only_reads_a_few_files_ahead(self, tmpdir):
+        src = tmpdir.mkdir("src")
+        file_count = compilers.READ_AHEAD * 3
+        for i in range(file_count):
+            src.join("Script{}.lua".format(i)).write("")
+        compiler = compilers.ModelCompiler(str(src), str(tmpdir.join("out")))
+
+        submitted = []
+
+        class Executor:
+            def submit(self, fn, *args):
+                submitted.append(args)
+
+        listing = compiler._list_directory(Executor(), str(src))
+
+        for taken in range(1, file_count + 1):
+            next(listing)
+            assert len(submitted) - taken < compilers.READ_AHEAD
+
+        assert len(submitted) == file_count
@@ -2,6 +2,20 @@ from textwrap import dedent
 
 from elixir import processors
 
+class TestSplittingExtensions:
+    def test_can_split_extension(self):
+        assert processors.split_extension("Script.lua") == ("Script", ".lua")
+
+    def test_only_splits_last_extension(self):
+        name = "Client.Main.lua"
+        assert processors.split_extension(name) == ("Client.Main", ".lua")
+
+    def test_leading_dots_are_not_an_extension(self):
+        assert processors.split_extension(".lua") == (".lua", "")
+
+    def test_can_split_name_without_extension(self):
+        assert processors.split_extension("Script") == ("Script", "")
+
 class TestGettingFileContents:
     def test_can_get_file_contents(self, tmpdir):
         f = tmpdir.join("file.txt")
@@ -11,6 +25,30 @@ class TestGettingFileContents:
 
         assert content == "Content"
 
+    def test_can_get_file_contents_as_bytes(self, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write("Content")
+
+        content = processors._get_file_contents(str(f), "rb")
+
+        assert content == b"Content"
+
+    def test_is_decoding_as_utf8(self, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write_binary("print(\"\u00e9\")".encode("utf-8"))
+
+        content = processors._get_file_contents(str(f))
+
+        assert content == "print(\"\u00e9\")"
+
+    def test_is_translating_line_endings(self, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write_binary(b"one\r\ntwo\rthree\n")
+
+        content = processors._get_file_contents(str(f))
+
+        assert content == "one\ntwo\nthree\n"
+
     def test_does_not_error_if_path_does_not_exist(self):
         fake_path = "/a/b/c"
         content = processors._get_file_contents(fake_path)
@@ -1,6 +1,8 @@
 from textwrap import dedent
 from xml.etree import ElementTree
 
+import pytest
+
 from elixir import rbxmx
 
 """Tests for ROBLOX-related XML generation."""
@@ -37,6 +39,10 @@ class TestBoolConversion:
     def test_bool_is_lowecased(self):
         assert rbxmx._convert_bool(True).islower() == True
 
+    def test_bools_match_lua(self):
+        assert rbxmx._convert_bool(True) == "true"
+        assert rbxmx._convert_bool(False) == "false"
+
 class TestSanitization:
     def test_is_converting_bools(self):
         assert type(rbxmx._sanitize(True)) is str
@@ -60,6 +66,14 @@ class TestModuleRecognition:
         content = "return setmetatable(module, mt)"
         assert rbxmx.is_module(content)
 
+    def test_matches_value_on_the_line_after_return(self):
+        content = "local module = {}\nreturn\n    module\n"
+        assert rbxmx.is_module(content)
+
+    def test_does_not_match_return_before_the_end(self):
+        content = "if not value then\n    return nil\nend\n"
+        assert not rbxmx.is_module(content)
+
 class TestBaseTag:
     def test_has_necessary_attributes(self):
         tag = rbxmx.get_base_tag()
@@ -68,6 +82,12 @@ class TestBaseTag:
         # recognize the file as a Model.
         assert tag.get("version")
 
+    def test_is_a_new_tag_each_time(self):
+        tag = rbxmx.get_base_tag()
+        tag.set("version", "0")
+
+        assert rbxmx.get_base_tag().get("version") == "4"
+
 class TestElementToStringConversion:
     def test_is_not_output_as_bytestring(self):
         item = _new_item()
@@ -78,6 +98,60 @@ class TestElementToStringConversion:
         expected_xml = "<Item class=\"Folder\"></Item>"
         assert rbxmx.tostring(item) == expected_xml
 
+    def test_matches_elementtree_output(self):
+        item = _new_item("Script")
+        item.set("name", "quotes \" and\nnewlines")
+        child = ElementTree.SubElement(item, "ProtectedString")
+        child.text = "if a < b and b > c then print(\"&\") end"
+        child.tail = "\n"
+
+        expected_xml = ElementTree.tostring(item, encoding="unicode",
+            short_empty_elements=False)
+
+        assert rbxmx.tostring(item) == expected_xml
+
+    def test_falls_back_on_elementtree_for_namespaces(self):
+        item = ElementTree.Element("{http://www.roblox.com/}Item")
+        expected_xml = ElementTree.tostring(item, encoding="unicode",
+            short_empty_elements=False)
+
+        assert rbxmx.tostring(item) == expected_xml
+
+    def test_start_and_end_make_up_the_whole_element(self):
+        item = rbxmx.InstanceElement("Folder").get_xml()
+
+        start = rbxmx.tostring_start(item)
+        end = rbxmx.tostring_end(item)
+
+        assert start + end == rbxmx.tostring(item)
+        assert end == "</Item>"
+
+    def test_start_leaves_off_the_tail(self):
+        item = rbxmx.InstanceElement("Folder").get_xml()
+        item.tail = "\n  "
+
+        start = rbxmx.tostring_start(item)
+
+        assert start == rbxmx.tostring(item)[:-len("</Item>\n  ")]
+
+    def test_start_can_have_namespaced_children(self):
+        item = rbxmx.InstanceElement("Folder").get_xml()
+        ElementTree.SubElement(item, "{urn:x}Child")
+
+        start = rbxmx.tostring_start(item)
+        end = rbxmx.tostring_end(item)
+
+        assert ElementTree.XML(start + end).find("{urn:x}Child") is not None
+
+    def test_start_and_end_raise_for_namespaced_elements(self):
+        item = ElementTree.Element("{urn:x}Item")
+
+        with pytest.raises(ValueError):
+            rbxmx.tostring_start(item)
+
+        with pytest.raises(ValueError):
+            rbxmx.tostring_end(item)
+
 class TestPropertyElement:
     def test_can_add_properties(self):
         item = _new_item()
@@ -106,6 +180,33 @@ class TestPropertyElement:
 
         assert prop.text == "Testing"
 
+    def test_can_get_properties_appended_directly(self):
+        item = _new_item()
+        properties = rbxmx.PropertyElement(item)
+        ElementTree.SubElement(properties.element, "string", name="Name")
+
+        assert properties.get("Name") is not None
+
+    def test_can_set_properties_that_replaced_removed_ones(self):
+        item = _new_item()
+        properties = rbxmx.PropertyElement(item)
+        old = properties.add("bool", "Disabled", False)
+
+        properties.element.remove(old)
+        new = ElementTree.SubElement(properties.element, "bool", name="Disabled")
+        properties.set("Disabled", "true")
+
+        assert new.text == "true"
+
+    def test_does_not_get_renamed_properties(self):
+        item = _new_item()
+        properties = rbxmx.PropertyElement(item)
+        prop = properties.add("string", "Name", "Testing")
+
+        prop.set("name", "OldName")
+
+        assert properties.get("Name") is None
+
 class TestInstanceElement:
     instance = rbxmx.InstanceElement("Folder")
     element = instance.element
@@ -141,6 +242,51 @@ class TestInstanceElement:
 
         assert xml_was_appeneded
 
+class TestModelElement:
+    content = dedent("""\
+        <roblox version="4">
+          <Item class="Folder"></Item>
+          <Item class="Script"></Item>
+        </roblox>""")
+
+    def test_only_imports_the_contents_of_the_model(self):
+        model = rbxmx.ModelElement(self.content)
+        importable = model.get_importable_xml()
+
+        assert [xml.get("class") for xml in importable] == ["Folder", "Script"]
+
+    def test_streams_the_same_contents_as_parsing_the_model(self):
+        model = rbxmx.ModelElement(self.content.encode("utf-8"))
+        model.chunk_size = 8
+
+        streamed = [ rbxmx.tostring(xml) for xml in model.get_importable_xml() ]
+        parsed = [ rbxmx.tostring(xml) for xml in model.get_xml() ]
+
+        assert streamed == parsed
+
+    def test_can_use_an_already_parsed_model(self):
+        root = ElementTree.XML(self.content)
+        model = rbxmx.ModelElement(root)
+        importable = model.get_importable_xml()
+
+        assert model.get_xml() is root
+        assert [xml.get("class") for xml in importable] == ["Folder", "Script"]
+
+    def test_can_replace_the_parsed_model(self):
+        model = rbxmx.ModelElement(self.content)
+        model.element = ElementTree.XML("<roblox><Item class=\"Model\"/></roblox>")
+        importable = model.get_importable_xml()
+
+        assert [xml.get("class") for xml in importable] == ["Model"]
+
+    def test_appending_to_other_elements(self):
+        model = rbxmx.ModelElement(self.content)
+        folder = rbxmx.InstanceElement("Folder")
+
+        model.append_to(folder.get_xml())
+
+        assert folder.get_xml().find("Item[@class='Script']") is not None
+
 class TestScriptElement:
     def test_disabled_is_converted_properly(self):
         script = rbxmx.ScriptElement("Script", disabled=True)
@@ -183,6 +329,32 @@ class TestScriptCommentMatching:
 
         assert first_comment == expected_output
 
+    def test_can_match_comment_after_code(self):
+        source = dedent("""\
+            print("Hello, World!")
+            -- ClassName: LocalScript""")
+
+        script = rbxmx.ScriptElement(source=source)
+        first_comment = script.get_first_comment()
+
+        assert first_comment == "-- ClassName: LocalScript"
+
+    def test_drops_windows_line_endings(self):
+        source = "-- Name: SomeScript\r\n-- ClassName: LocalScript\r\n\r\nprint()"
+
+        script = rbxmx.ScriptElement(source=source)
+        first_comment = script.get_first_comment()
+
+        assert first_comment == "-- Name: SomeScript\n-- ClassName: LocalScript"
+
+    def test_ends_lines_on_form_feeds(self):
+        source = "-- Name: SomeScript\x0cprint()\n-- ClassName: LocalScript"
+
+        script = rbxmx.ScriptElement(source=source)
+        first_comment = script.get_first_comment()
+
+        assert first_comment == "-- Name: SomeScript"
+
     def test_does_not_error_without_source(self):
         script = rbxmx.ScriptElement() # No `source` argument
         comment = script.get_first_comment()
@@ -241,6 +413,14 @@ class TestEmbeddedScriptProperties:
 
         assert properties["ClassName"] == "LocalScript"
 
+    def test_last_embedded_property_wins(self):
+        source = "-- Name: First\n-- Name: Second"
+
+        script = rbxmx.ScriptElement(source=source)
+        properties = script.get_embedded_properties()
+
+        assert properties == { "Name": "Second" }
+
     def test_does_not_detect_regular_comments_as_embedded_properties(self):
         source = "-- This is a comment"
 